@@ -6,11 +6,29 @@ import datetime
 import csv
 import os
 import random
+import json
+import time
+import threading
+import argparse
+import mmap
+import struct
+import weakref
+import sqlite3
+import smtplib
+from email.message import EmailMessage
 
 # --- Constants & Configuration ---
 WINDOW_TITLE = "Voyago – Bus Ticket Booking"
 WINDOW_SIZE = "1200x1200"
-DATA_FILE = "bookings.csv"
+BOOKINGS_DIR = "bookings"        # One CSV per day and shard, named after the booking ID
+NOTIFY_DB = "notifications.db"   # Durable outbound queue for confirmations
+OUTBOX_DIR = "outbox"            # Where the local SMTP stand-in drops messages
+SCHEDULE_SOURCE = "schedule.csv" # Optional timetable; dummy buses are generated without it
+SNAPSHOT_FILE = "schedule.snap"  # Binary schedule + seat inventory for instant warm start
+FLOW_STATE_FILE = "flow_state.json"  # Booking flow saved on exit and resumed on next launch
+ID_TICK_FILE = "ids-s{shard:03d}.tick"  # Last ID tick per shard, so a restart never reuses one
+BOOKING_HEADER = ["Booking ID", "From", "To", "Date of Journey", "Bus Name",
+                  "Seat Numbers", "Passenger Name", "Age", "Gender", "Contact", "Email", "Total Fare"]
 
 # Color Palette (Redbus-inspired)
 COLOR_PRIMARY = "#4A90E2"  # Subtle Blue
@@ -28,17 +46,648 @@ CITIES = [
     "Chandigarh", "Mumbai", "Madurai", "Mangalore"
 ]
 
+# --- Helper Class: ID Allocator ---
+# IDs are 65-bit integers printed as 13 Crockford base32 characters after a prefix:
+#   10ms tick since ID_EPOCH (36 bits) | shard (7) | thread slot (8) | sequence (14)
+# Fixed width keeps them sortable as plain strings, in allocation-time order.
+ID_EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+ID_TICKS_PER_SEC = 100
+_ID_SHARD_BITS, _ID_SLOT_BITS, _ID_SEQ_BITS = 7, 8, 14
+_ID_MAX_SEQ = (1 << _ID_SEQ_BITS) - 1
+_ID_LENGTH = 13
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_CROCKFORD_PAIRS = [a + b for a in _CROCKFORD for b in _CROCKFORD]   # 10 bits -> 2 chars
+
+class _SlotLease:
+    """A thread's hold on an allocator slot, kept in the allocator's threading.local."""
+    __slots__ = ("state", "shared", "__weakref__")
+
+    def __init__(self, state, shared=False):
+        self.state = state     # [slot, last tick, last sequence]
+        self.shared = shared
+
+class IdAllocator:
+    """
+    Collision-free, time-sortable ID allocator.
+    Each process (kiosk, worker) needs its own shard number (0-127). Within
+    a process every allocating thread claims its own slot once, so
+    allocation itself never takes a lock. If more threads allocate at once
+    than there are slots, the extra ones share the last slot under a lock.
+    """
+    def __init__(self, prefix, shard=0):
+        if not 0 <= shard < 1 << _ID_SHARD_BITS:
+            raise ValueError(f"shard must be between 0 and {(1 << _ID_SHARD_BITS) - 1}")
+        self.prefix = prefix
+        self.shard = shard
+        self._local = threading.local()
+        self._slot_lock = threading.Lock()   # Only taken the first time a thread allocates
+        self._free_slots = []
+        self._next_slot = 0
+        self._floor = 0     # No ID may use an earlier tick (see advance_to)
+        self._overflow = _SlotLease([(1 << _ID_SLOT_BITS) - 1, 0, -1], shared=True)
+        self._overflow_lock = threading.Lock()
+        self._states = [self._overflow.state]   # Every slot's [slot, last tick, last sequence]
+
+    def _claim_slot(self):
+        with self._slot_lock:
+            if self._free_slots:
+                state = self._free_slots.pop()
+            elif self._next_slot < self._overflow.state[0]:
+                state = [self._next_slot, self._floor, -1]
+                self._states.append(state)
+                self._next_slot += 1
+            else:
+                return self._overflow
+        lease = _SlotLease(state)
+        # The lease lives only in this thread's local storage, so it is freed
+        # as soon as the thread ends. Its last tick travels with the slot so
+        # the next owner can't reuse a sequence number.
+        weakref.finalize(lease, self._release_slot, state)
+        return lease
+
+    def _release_slot(self, state):
+        with self._slot_lock:
+            self._free_slots.append(state)
+
+    def next_id(self):
+        try:
+            lease = self._local.lease
+        except AttributeError:
+            lease = self._local.lease = self._claim_slot()
+        if lease.shared:
+            with self._overflow_lock:
+                return self._allocate(lease.state)
+        return self._allocate(lease.state)
+
+    def advance_to(self, tick):
+        """Makes every later ID use `tick` or a later one. Call before allocating."""
+        with self._slot_lock:
+            self._floor = max(self._floor, tick)
+            for state in self._states:
+                if state[1] < self._floor:
+                    state[1], state[2] = self._floor, -1
+
+    def last_tick(self):
+        """Highest tick any slot has reached, including the floor."""
+        with self._slot_lock:
+            return max([self._floor] + [state[1] for state in self._states])
+
+    def _allocate(self, state):
+        tick = _id_tick()
+        if tick > state[1]:
+            state[1] = tick
+            state[2] = 0
+        else:
+            # Same tick or the clock stepped back: keep counting from the last ID
+            state[2] += 1
+            if state[2] > _ID_MAX_SEQ:
+                state[1] += 1
+                state[2] = 0
+        value = (((state[1] << _ID_SHARD_BITS | self.shard) << _ID_SLOT_BITS | state[0])
+                 << _ID_SEQ_BITS | state[2])
+        return self.prefix + _encode_id(value)
+
+def _id_tick():
+    return int((time.time() - ID_EPOCH) * ID_TICKS_PER_SEC)
+
+def restore_id_ticks(path, allocators):
+    """
+    Starts the allocators after the tick saved in `path` (or now, if later)
+    and saves that start point, so IDs stay unique across restarts even if
+    the clock was set back in between.
+    """
+    saved = -1
+    try:
+        with open(path) as f:
+            saved = int(f.read().strip())
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Could not read {path}, IDs start from the clock: {e}")
+    start = max(saved + 1, _id_tick())
+    for allocator in allocators:
+        allocator.advance_to(start)
+    save_id_ticks(path, allocators)
+
+def save_id_ticks(path, allocators):
+    """Writes the highest tick the allocators have used, atomically."""
+    tick = max(allocator.last_tick() for allocator in allocators)
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(f"{tick}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save {path}: {e}")
+
+def _encode_id(value):
+    # 65 bits: one leading character, then six 10-bit pairs
+    out = [_CROCKFORD[value >> 60]]
+    for shift in (50, 40, 30, 20, 10, 0):
+        out.append(_CROCKFORD_PAIRS[value >> shift & 0x3FF])
+    return "".join(out)
+
+def decode_id(id_str):
+    """
+    Splits an allocator ID into its parts. Raises ValueError for IDs the
+    allocator did not produce (e.g. older random BKG numbers).
+    """
+    body = id_str[-_ID_LENGTH:]
+    if len(id_str) <= _ID_LENGTH or any(ch not in _CROCKFORD for ch in body):
+        raise ValueError(f"not an allocator ID: {id_str}")
+    value = 0
+    for ch in body:
+        value = value << 5 | _CROCKFORD.index(ch)
+    seq = value & _ID_MAX_SEQ
+    value >>= _ID_SEQ_BITS
+    slot = value & ((1 << _ID_SLOT_BITS) - 1)
+    value >>= _ID_SLOT_BITS
+    shard = value & ((1 << _ID_SHARD_BITS) - 1)
+    tick = value >> _ID_SHARD_BITS
+    created = datetime.datetime.fromtimestamp(ID_EPOCH + tick / ID_TICKS_PER_SEC, tz=datetime.timezone.utc)
+    return {"prefix": id_str[:-_ID_LENGTH], "created": created, "shard": shard, "slot": slot, "seq": seq}
+
+# The shard is set from --shard / VOYAGO_SHARD when the app starts
+BOOKING_IDS = IdAllocator("BKG")
+BUS_IDS = IdAllocator("BUS")
+
+
+# --- Seat Layout (4 cols x 8 rows, aisle between B and C) ---
+SEAT_ROWS = 8
+SEAT_COL_LABELS = ['A', 'B', 'C', 'D']
+ALL_SEATS = [f"{r}{c}" for r in range(1, SEAT_ROWS + 1) for c in SEAT_COL_LABELS]
+
+def seat_bit(seat_num):
+    """Bit position of a seat in the occupancy bitmap ("1A" -> 0, "8D" -> 31)."""
+    return (int(seat_num[:-1]) - 1) * len(SEAT_COL_LABELS) + SEAT_COL_LABELS.index(seat_num[-1])
+
+def seats_to_mask(seats):
+    mask = 0
+    for s in seats:
+        mask |= 1 << seat_bit(s)
+    return mask
+
+def mask_to_seats(mask):
+    return [s for i, s in enumerate(ALL_SEATS) if mask >> i & 1]
+
+
+# --- Group Seat Recommendation ---
+# Candidate seat groups are precomputed once per (group size, preference) as
+# bitmasks, best first, so checking a bus is just `mask & booked == 0`.
+WINDOW_COLS = ('A', 'D')
+AISLE_COLS = ('B', 'C')   # The aisle gap runs between B and C
+SEAT_PREFERENCES = ["Any", "Window", "Aisle"]
+_COLS_MASK = (1 << len(SEAT_COL_LABELS)) - 1
+_WINDOW_MASK = seats_to_mask(f"{r}{c}" for r in range(1, SEAT_ROWS + 1) for c in WINDOW_COLS)
+_AISLE_MASK = seats_to_mask(f"{r}{c}" for r in range(1, SEAT_ROWS + 1) for c in AISLE_COLS)
+_candidate_cache = {}
+
+def _row_mask(row, cols):
+    """Mask for the given column indexes of a 0-based row."""
+    mask = 0
+    for c in cols:
+        mask |= 1 << (row * len(SEAT_COL_LABELS) + c)
+    return mask
+
+def _group_shapes(n):
+    """
+    Yields (mask, rows_spanned, aisle_splits) for every way of seating n people
+    together: a run within one row, pairs stacked on one side of the aisle,
+    or whole rows back to back.
+    """
+    cols = len(SEAT_COL_LABELS)
+    left = [SEAT_COL_LABELS.index(c) for c in ('A', 'B')]
+    right = [SEAT_COL_LABELS.index(c) for c in ('C', 'D')]
+    # Same row, contiguous run; crossing from B to C splits the group by the aisle
+    if n <= cols:
+        for row in range(SEAT_ROWS):
+            for start in range(cols - n + 1):
+                run = range(start, start + n)
+                splits = 1 if (left[-1] in run and right[0] in run) else 0
+                yield _row_mask(row, run), 1, splits
+    # Pairs on one side of the aisle, stacked over consecutive rows
+    if 2 < n <= 2 * SEAT_ROWS:
+        rows = -(-n // 2)
+        for side in (left, right):
+            for first in range(SEAT_ROWS - rows + 1):
+                body = 0
+                for row in range(first, first + rows - 1):
+                    body |= _row_mask(row, side)
+                last = first + rows - 1
+                if n % 2 == 0:
+                    yield body | _row_mask(last, side), rows, 0
+                else:
+                    for c in side:
+                        yield body | _row_mask(last, [c]), rows, 0
+    # Full rows back to back, with the remainder as a run in the next row
+    if n > cols:
+        full, rest = divmod(n, cols)
+        rows = full + (1 if rest else 0)
+        for first in range(SEAT_ROWS - rows + 1):
+            body = 0
+            for row in range(first, first + full):
+                body |= _COLS_MASK << (row * cols)
+            if not rest:
+                yield body, rows, full
+                continue
+            for start in range(cols - rest + 1):
+                run = range(start, start + rest)
+                yield body | _row_mask(first + full, run), rows, full + (1 if (left[-1] in run and right[0] in run) else 0)
+
+def _group_candidates(n, preference):
+    """Returns [(score, mask)] for a group size and preference, best (lowest) first."""
+    key = (n, preference)
+    if key not in _candidate_cache:
+        liked = {"Window": _WINDOW_MASK, "Aisle": _AISLE_MASK}.get(preference, 0)
+        scored = {}
+        for mask, rows, splits in _group_shapes(n):
+            # Fewer rows and no aisle split keep the group together; then favour preferred seats
+            score = (rows - 1) * 10 + splits * 4 - bin(mask & liked).count("1")
+            if mask not in scored or score < scored[mask]:
+                scored[mask] = score
+        # Ties go to the seat nearest the front
+        _candidate_cache[key] = sorted(((s, m) for m, s in scored.items()),
+                                       key=lambda sm: (sm[0], (sm[1] & -sm[1]).bit_length()))
+    return _candidate_cache[key]
+
+def recommend_seats(booked_mask, n, preference="Any"):
+    """
+    Best free seats for a group of n on a bus with the given occupancy bitmap.
+    Returns (seats, score) or None when the group cannot sit together.
+    """
+    for score, mask in _group_candidates(n, preference):
+        if not mask & booked_mask:
+            return mask_to_seats(mask), score
+    return None
+
+def rank_buses_for_group(buses, n, preference="Any"):
+    """
+    Ranks search results by how well a group of n fits, best first.
+    Returns [(bus, seats, score)]; buses that cannot seat the group together are left out.
+    """
+    candidates = _group_candidates(n, preference)
+    ranked = []
+    for bus in buses:
+        booked = seats_to_mask(bus["seats_booked"])
+        for score, mask in candidates:
+            if not mask & booked:
+                ranked.append((bus, mask_to_seats(mask), score))
+                break
+    ranked.sort(key=lambda r: (r[2], r[0]["price"]))
+    return ranked
+
+# --- Helper Class: Schedule Snapshot ---
+class ScheduleSnapshot:
+    """
+    Read-only view over the binary schedule snapshot. The buffer can be an
+    mmap of SNAPSHOT_FILE, so a cold start only reads the header and the
+    route table; bus records and strings are decoded on demand.
+
+    Layout (little-endian):
+        header | bus records (sorted by route) | route table | seat inventory | string offsets | string bytes
+
+    The seat inventory holds one booked-seat mask per (bus, travel date).
+    """
+    MAGIC = b"VYGS"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHHIIIIqq")       # magic, version, reserved, buses, routes, inventory, strings, src mtime_ns, src size
+    RECORD = struct.Struct("<IIIIIHHHIBx")      # id, name, type, from, to, dep, arr, duration (min), price, seats
+    ROUTE = struct.Struct("<IIII")              # from, to, first record, record count
+    INVENTORY = struct.Struct("<III")           # bus record, travel date (ordinal), booked mask
+    OFFSET = struct.Struct("<I")
+
+    def __init__(self, buf):
+        self.buf = buf
+        magic, version, _, self.bus_count, route_count, inventory_count, string_count, mtime_ns, size = \
+            self.HEADER.unpack_from(buf, 0)
+        if magic != self.MAGIC:
+            raise ValueError("not a Voyago schedule snapshot")
+        if version != self.VERSION:
+            raise ValueError(f"unsupported snapshot version {version}")
+        self.source_signature = (mtime_ns, size)
+
+        self._records_at = self.HEADER.size
+        routes_at = self._records_at + self.bus_count * self.RECORD.size
+        inventory_at = routes_at + route_count * self.ROUTE.size
+        self._offsets_at = inventory_at + inventory_count * self.INVENTORY.size
+        self._strings_at = self._offsets_at + (string_count + 1) * self.OFFSET.size
+        if len(buf) < self._strings_at:
+            raise ValueError("truncated snapshot")
+        self._strings = [None] * string_count
+
+        self.routes = {}
+        for i in range(route_count):
+            f, t, start, count = self.ROUTE.unpack_from(buf, routes_at + i * self.ROUTE.size)
+            self.routes[(self.string(f), self.string(t))] = (start, count)
+
+        # (bus id, date ordinal) -> booked mask; old dates are pruned on every rebuild
+        self.inventory = {}
+        for i in range(inventory_count):
+            rec, day, mask = self.INVENTORY.unpack_from(buf, inventory_at + i * self.INVENTORY.size)
+            bus_id = self.RECORD.unpack_from(buf, self._records_at + rec * self.RECORD.size)[0]
+            self.inventory[(self.string(bus_id), day)] = mask
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps a snapshot file. Raises OSError/ValueError if it is missing or unusable."""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(mm)
+        except (ValueError, struct.error):
+            mm.close()
+            raise
+
+    def string(self, idx):
+        s = self._strings[idx]
+        if s is None:
+            start, = self.OFFSET.unpack_from(self.buf, self._offsets_at + idx * self.OFFSET.size)
+            end, = self.OFFSET.unpack_from(self.buf, self._offsets_at + (idx + 1) * self.OFFSET.size)
+            s = bytes(self.buf[self._strings_at + start:self._strings_at + end]).decode("utf-8")
+            self._strings[idx] = s
+        return s
+
+    def bus(self, idx):
+        """Decodes one bus record into the dict shape the screens use."""
+        (bus_id, name, bus_type, f, t, dep, arr, duration,
+         price, seats_total) = self.RECORD.unpack_from(self.buf, self._records_at + idx * self.RECORD.size)
+        return {
+            "id": self.string(bus_id),
+            "name": self.string(name),
+            "type": self.string(bus_type),
+            "from": self.string(f),
+            "to": self.string(t),
+            "dep_time": f"{dep // 60:02d}:{dep % 60:02d}",
+            "arr_time": f"{arr // 60:02d}:{arr % 60:02d}",
+            "duration": f"{duration // 60}h {duration % 60:02d}m",
+            "price": price,
+            "seats_total": seats_total,
+        }
+
+    def route(self, from_city, to_city):
+        start, count = self.routes.get((from_city, to_city), (0, 0))
+        return [self.bus(i) for i in range(start, start + count)]
+
+    def all_buses(self):
+        return [self.bus(i) for i in range(self.bus_count)]
+
+    @classmethod
+    def pack(cls, buses, inventory=None, source_signature=(0, 0)):
+        """
+        Serialises a list of bus dicts (as produced by bus()) and an inventory of
+        {(bus id, date ordinal): booked mask} into snapshot bytes.
+        """
+        buses = sorted(buses, key=lambda b: (b["from"], b["to"], b["dep_time"]))
+        strings, string_idx = [], {}
+
+        def intern(s):
+            if s not in string_idx:
+                string_idx[s] = len(strings)
+                strings.append(s.encode("utf-8"))
+            return string_idx[s]
+
+        records, routes = bytearray(), []
+        for i, b in enumerate(buses):
+            key = (intern(b["from"]), intern(b["to"]))
+            if routes and tuple(routes[-1][:2]) == key:
+                routes[-1][3] += 1
+            else:
+                routes.append([key[0], key[1], i, 1])
+            records += cls.RECORD.pack(
+                intern(b["id"]), intern(b["name"]), intern(b["type"]), key[0], key[1],
+                _minutes(b["dep_time"]), _minutes(b["arr_time"]), _duration_minutes(b["duration"]),
+                b["price"], b["seats_total"])
+
+        record_of = {b["id"]: i for i, b in enumerate(buses)}
+        entries = sorted((record_of[bus_id], day, mask) for (bus_id, day), mask in (inventory or {}).items()
+                         if bus_id in record_of and mask)
+
+        out = bytearray(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, len(buses), len(routes), len(entries),
+                                        len(strings), source_signature[0], source_signature[1]))
+        out += records
+        for r in routes:
+            out += cls.ROUTE.pack(*r)
+        for e in entries:
+            out += cls.INVENTORY.pack(*e)
+        offset = 0
+        for s in strings:
+            out += cls.OFFSET.pack(offset)
+            offset += len(s)
+        out += cls.OFFSET.pack(offset)
+        for s in strings:
+            out += s
+        return bytes(out)
+
+    @classmethod
+    def write(cls, path, buses, inventory=None, source_signature=(0, 0)):
+        """Writes a snapshot atomically so readers never see a half-written file."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.pack(buses, inventory, source_signature))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+def _travel_day(date_str):
+    """Date ordinal for a "DD-MM-YYYY" journey date, or None if it can't be parsed."""
+    try:
+        return datetime.datetime.strptime(date_str, "%d-%m-%Y").date().toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def _minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+def _duration_minutes(text):
+    # "7h 00m" -> 420
+    h, _, m = text.partition("h")
+    return int(h) * 60 + int(m.strip().rstrip("m") or 0)
+
+def _check_time(hhmm):
+    """Returns a "HH:MM" time unchanged, or raises ValueError."""
+    h, sep, m = (hhmm or "").partition(":")
+    if not (sep and h.isdigit() and m.isdigit() and len(m) == 2 and int(h) < 24 and int(m) < 60):
+        raise ValueError(f"bad time {hhmm!r}")
+    return hhmm
+
+def _check_range(name, value, low, high):
+    """Parses an int field and checks low <= value <= high, or raises ValueError."""
+    number = int(value)
+    if not low <= number <= high:
+        raise ValueError(f"{name} {number} out of range {low}-{high}")
+    return number
+
+def _schedule_row(rec):
+    """
+    Turns one schedule.csv row into a bus dict. Raises ValueError for a row
+    that doesn't fit a snapshot record (missing text, bad time, out-of-range number).
+    """
+    for field in ("id", "name", "type", "from", "to"):
+        if not rec.get(field):
+            raise ValueError(f"missing {field}")
+    duration = _check_range("duration_min", rec["duration_min"], 0, 0xFFFF)
+    return {
+        "id": rec["id"],
+        "name": rec["name"],
+        "type": rec["type"],
+        "from": rec["from"],
+        "to": rec["to"],
+        "dep_time": _check_time(rec["dep_time"]),
+        "arr_time": _check_time(rec["arr_time"]),
+        "duration": f"{duration // 60}h {duration % 60:02d}m",
+        "price": _check_range("price", rec["price"], 0, 0xFFFFFFFF),
+        "seats_total": _check_range("seats_total", rec.get("seats_total") or len(ALL_SEATS), 1, 0xFF),
+    }
+
+
 # --- Helper Class: Bus Data Service ---
 class BusService:
     """
     Simulates a backend service to fetch bus data.
+    The schedule and seat inventory are served from a memory-mapped
+    snapshot (SNAPSHOT_FILE) that is refreshed in the background whenever
+    the timetable source (SCHEDULE_SOURCE) changes or seats get booked.
+    Pass snapshot_file=None to keep everything in memory.
     """
-    def __init__(self):
-        self.buses = []
-        self._generate_dummy_data()
+    def __init__(self, source_file=SCHEDULE_SOURCE, snapshot_file=SNAPSHOT_FILE, refresh_interval=30.0):
+        self.source_file = source_file
+        self.snapshot_file = snapshot_file
+        self.refresh_interval = refresh_interval
+        self.snapshot = None
+        self._inventory = {}   # (bus id, date ordinal) -> seats booked since the last snapshot was written
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+
+        if snapshot_file:
+            try:
+                self.snapshot = ScheduleSnapshot.open(snapshot_file)
+            except (OSError, ValueError):
+                self.snapshot = None   # Missing or stale format: rebuild below
+        if self.snapshot is None:
+            try:
+                try:
+                    self._rebuild(reparse=True)
+                except OSError as e:
+                    # Can't write the snapshot here; serve from memory rather than not start
+                    print(f"Could not write {snapshot_file}, keeping the schedule in memory: {e}")
+                    self.snapshot_file = None
+                    self._rebuild(reparse=True)
+            except (struct.error, ValueError) as e:
+                # The timetable can't be packed at all: start on the built-in schedule
+                print(f"Could not build the schedule snapshot, using built-in data: {e}")
+                self.snapshot_file = None
+                self.snapshot = ScheduleSnapshot(ScheduleSnapshot.pack(self._generate_dummy_data()))
+        if self.snapshot_file and refresh_interval:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="schedule-refresh", daemon=True)
+            self._refresher.start()
+
+    def _source_signature(self):
+        try:
+            st = os.stat(self.source_file)
+        except OSError:
+            return (0, 0)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load_source(self):
+        """Parses the timetable CSV, falling back to dummy data when there is none."""
+        if not os.path.isfile(self.source_file):
+            return self._generate_dummy_data()
+        buses = []
+        with open(self.source_file, newline='') as f:
+            reader = csv.DictReader(f)
+            for rec in reader:
+                try:
+                    buses.append(_schedule_row(rec))
+                except (KeyError, ValueError) as e:
+                    # One bad row must not cost the whole timetable
+                    print(f"Skipping line {reader.line_num} of {self.source_file}: {e}")
+        return buses
+
+    def _rebuild(self, reparse):
+        with self._rebuild_lock:
+            self._rebuild_locked(reparse)
+
+    def _rebuild_locked(self, reparse):
+        """
+        Produces a fresh snapshot: re-reads the source if it changed, carries
+        the seat inventory over, drops past travel dates and folds in recent bookings.
+        """
+        with self._lock:
+            pending = dict(self._inventory)
+        old = self.snapshot
+        signature = self._source_signature()
+        if reparse or old is None:
+            try:
+                buses = self._load_source()
+            except (OSError, KeyError, ValueError, csv.Error) as e:
+                # A broken timetable must not take the kiosk down: keep the last good schedule
+                print(f"Could not read {self.source_file}: {e}")
+                buses = old.all_buses() if old else self._generate_dummy_data()
+        else:
+            buses = old.all_buses()
+
+        today = datetime.date.today().toordinal()
+        inventory = {}
+        for source in (old.inventory if old else {}, pending):
+            for key, mask in source.items():
+                if key[1] >= today:
+                    inventory[key] = inventory.get(key, 0) | mask
+
+        if self.snapshot_file:
+            ScheduleSnapshot.write(self.snapshot_file, buses, inventory, signature)
+            snapshot = ScheduleSnapshot.open(self.snapshot_file)
+        else:
+            snapshot = ScheduleSnapshot(ScheduleSnapshot.pack(buses, inventory, signature))
+
+        # Swap, then forget bookings the new snapshot already contains
+        known = {b["id"] for b in buses}
+        with self._lock:
+            self.snapshot = snapshot
+            for key, mask in pending.items():
+                if self._inventory.get(key) == mask or key[0] not in known or key[1] < today:
+                    del self._inventory[key]
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self):
+        """Rebuilds the snapshot if the source changed or there are unsaved bookings."""
+        source_changed = self._source_signature() != self.snapshot.source_signature
+        if source_changed or self._inventory:
+            try:
+                self._rebuild(reparse=source_changed)
+            except (OSError, ValueError, KeyError, struct.error) as e:
+                print(f"Schedule refresh failed, still serving the previous snapshot: {e}")
+
+    def close(self):
+        """Stops the refresher and writes out any bookings not yet in the snapshot."""
+        self._stop.set()
+        if self._refresher:
+            self._refresher.join(2.0)
+        if self.snapshot_file and self._inventory:
+            try:
+                self._rebuild(reparse=False)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Could not save seat inventory: {e}")
+
+    def mark_booked(self, bus_id, date_str, seats):
+        """Records seats booked on a travel date; persisted on the next refresh."""
+        day = _travel_day(date_str)
+        if day is None:
+            return
+        with self._lock:
+            key = (bus_id, day)
+            self._inventory[key] = self._inventory.get(key, 0) | seats_to_mask(seats)
 
     def _generate_dummy_data(self):
         """Generates a list of dummy buses for demonstration."""
+        buses = []
         bus_types = ["Sleeper", "Semi-sleeper", "AC Volvo", "Non-AC Seater"]
         travels = ["Voyago Travels", "GreenLine", "CityConnect", "RoadKing", "StarBus"]
         
@@ -61,8 +710,8 @@ class BusService:
             
             price = random.choice([450, 600, 850, 1200, 1500])
             
-            self.buses.append({
-                "id": f"BUS{random.randint(1000, 9999)}",
+            buses.append({
+                "id": BUS_IDS.next_id(),
                 "name": random.choice(travels),
                 "type": random.choice(bus_types),
                 "from": start_city,
@@ -72,8 +721,8 @@ class BusService:
                 "duration": f"{duration_h}h 00m",
                 "price": price,
                 "seats_total": 32,
-                "seats_booked": [] # List of booked seat numbers (e.g., "1A", "2B")
             })
+        return buses
 
     def search_buses(self, from_city, to_city, date_str):
         """
@@ -82,25 +731,20 @@ class BusService:
         of the bus in this dummy generator, but we pretend it is.
         """
         results = []
-        for bus in self.buses:
-            if bus["from"] == from_city and bus["to"] == to_city:
-                # Deep copy to avoid modifying the original template for this session
-                # In a real app, we'd fetch specific schedule for the date
-                bus_copy = bus.copy()
-                # Simulate some random booked seats for this specific date search
-                # We'll just generate them on the fly for the UI to render
-                booked_count = random.randint(0, 20)
-                all_seats = []
-                rows = 8
-                cols = 4
-                col_labels = ['A', 'B', 'C', 'D']
-                for r in range(1, rows + 1):
-                    for c in col_labels:
-                        all_seats.append(f"{r}{c}")
-                
-                bus_copy["seats_booked"] = random.sample(all_seats, booked_count)
-                bus_copy["seats_available"] = bus_copy["seats_total"] - len(bus_copy["seats_booked"])
-                results.append(bus_copy)
+        snapshot = self.snapshot
+        day = _travel_day(date_str)
+        for bus_copy in snapshot.route(from_city, to_city):
+            # Seats sold through Voyago on this date plus some random booked seats for this specific date search
+            key = (bus_copy["id"], day)
+            with self._lock:
+                booked_mask = snapshot.inventory.get(key, 0) | self._inventory.get(key, 0)
+            booked = set(mask_to_seats(booked_mask))
+            booked_count = random.randint(0, 20)
+            booked.update(random.sample(ALL_SEATS, booked_count))
+            
+            bus_copy["seats_booked"] = [s for s in ALL_SEATS if s in booked]
+            bus_copy["seats_available"] = bus_copy["seats_total"] - len(bus_copy["seats_booked"])
+            results.append(bus_copy)
         
         # Fallback: If no buses found, generate some on the fly for this route
         if not results:
@@ -121,7 +765,7 @@ class BusService:
                 price = random.choice([450, 600, 850, 1200, 1500])
                 
                 new_bus = {
-                    "id": f"BUS{random.randint(1000, 9999)}",
+                    "id": BUS_IDS.next_id(),
                     "name": random.choice(travels),
                     "type": random.choice(bus_types),
                     "from": from_city,   # Force match
@@ -152,9 +796,742 @@ class BusService:
         return results
 
 
+# --- Booking Logic (shared by the UI and the load harness) ---
+_booking_file_lock = threading.Lock()
+
+def validate_passenger(name, age, gender, email, phone):
+    """
+    Checks the passenger form. Returns None if valid, otherwise a
+    (title, message) tuple suitable for a messagebox.
+    """
+    if not name or not age or not gender or not email or not phone:
+        return ("Missing Info", "Please fill all fields.")
+
+    if not age.isdigit() or int(age) <= 0:
+        return ("Invalid Input", "Age must be a positive number.")
+
+    if "@" not in email:
+        return ("Invalid Input", "Please enter a valid email.")
+
+    if not phone.isdigit() or len(phone) != 10:
+        return ("Invalid Input", "Phone number must be 10 digits.")
+
+    return None
+
+_partition_index = {}   # partition file -> {booking id: row}, filled on first lookup
+
+def booking_partition(booking_id, data_dir=BOOKINGS_DIR):
+    """Path of the CSV partition holding a booking: <data_dir>/<UTC date>-s<shard>.csv"""
+    parts = decode_id(booking_id)
+    return os.path.join(data_dir, f"{parts['created']:%Y-%m-%d}-s{parts['shard']:03d}.csv")
+
+def write_booking(row, data_dir=BOOKINGS_DIR):
+    """Appends one booking row to its partition CSV, writing the header on first use."""
+    path = booking_partition(row[0], data_dir)
+    # Several virtual users may write at once during a load run
+    with _booking_file_lock:
+        os.makedirs(data_dir, exist_ok=True)
+        file_exists = os.path.isfile(path)
+        with open(path, mode='a', newline='') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(BOOKING_HEADER)
+            writer.writerow(row)
+        if path in _partition_index:
+            _partition_index[path][row[0]] = [str(v) for v in row]
+
+def find_booking(booking_id, data_dir=BOOKINGS_DIR):
+    """
+    Looks up a booking by ID. The ID names its partition, so only that file
+    is read (once); later lookups are a dict hit. Returns a dict or None.
+    """
+    try:
+        path = booking_partition(booking_id, data_dir)
+    except ValueError:
+        return None
+    with _booking_file_lock:
+        index = _partition_index.get(path)
+        if index is None:
+            index = {}
+            if os.path.isfile(path):
+                with open(path, newline='') as f:
+                    reader = csv.reader(f)
+                    next(reader, None)   # Header
+                    for r in reader:
+                        index[r[0]] = r
+            _partition_index[path] = index
+        row = index.get(booking_id)
+    return dict(zip(BOOKING_HEADER, row)) if row else None
+
+def place_booking(state, bus_service, notifications, data_dir=BOOKINGS_DIR):
+    """
+    Confirms the booking held in a BookingState: writes the row, marks the
+    seats sold and queues the confirmations. Raises if the row can't be
+    written; a failure to queue is only logged since the booking already
+    stands. Returns (booking_id, seats).
+    """
+    details = state.passenger_details
+    bus = state.selected_bus
+    date = state.search_criteria["date"]
+    seats = ",".join(state.selected_seats)
+    booking_id = BOOKING_IDS.next_id()
+    
+    row = [
+        booking_id,
+        bus["from"],
+        bus["to"],
+        date,
+        bus["name"],
+        seats,
+        details.get("name"),
+        details.get("age"),
+        details.get("gender"),
+        details.get("phone"),
+        details.get("email"),
+        state.total_fare
+    ]
+    write_booking(row, data_dir)
+    bus_service.mark_booked(bus["id"], date, state.selected_seats)
+    
+    # The booking is persisted; everything below is cheap or deferred
+    try:
+        queue_booking_confirmation(notifications, booking_id, bus, date, seats, details, state.total_fare)
+    except sqlite3.Error as e:
+        print(f"Could not queue confirmation for {booking_id}: {e}")
+    return booking_id, seats
+
+
+# --- Helper Class: Booking State Store ---
+class SeatSelection:
+    """
+    Selected seats in click order, with O(1) add, remove and membership.
+    The "1A, 2B" summary text is kept up to date as seats are added and only
+    rebuilt after a removal.
+    """
+    def __init__(self, seats=()):
+        self._seats = dict.fromkeys(seats)
+        self._label = None
+
+    def __contains__(self, seat_num):
+        return seat_num in self._seats
+
+    def __len__(self):
+        return len(self._seats)
+
+    def __iter__(self):
+        return iter(self._seats)
+
+    def toggle(self, seat_num):
+        """Adds or removes a seat. Returns True if it is now selected."""
+        if seat_num in self._seats:
+            del self._seats[seat_num]
+            self._label = None
+            return False
+        self._seats[seat_num] = None
+        if self._label is not None:
+            self._label = f"{self._label}, {seat_num}" if self._label else seat_num
+        return True
+
+    def label(self):
+        if self._label is None:
+            self._label = ", ".join(self._seats)
+        return self._label
+
+    def as_list(self):
+        return list(self._seats)
+
+class BookingState:
+    """
+    Observable store for the state the booking screens share.
+    Widgets subscribe to the fields they show and are called only when that
+    field changes. Nothing here touches Tk, so the flow can be driven and
+    checked headlessly, and snapshot()/restore() let a flow resume as it was.
+
+    Callbacks get the new value, except for "selected_seats" whose callbacks
+    get (seat_num, selected) for one toggle or (None, False) when the whole
+    selection is cleared.
+    """
+    FIELDS = ("screen", "search_criteria", "search_results", "selected_bus", "selected_seats",
+              "total_fare", "passenger_details", "group_size", "seat_preference")
+
+    def __init__(self):
+        self._listeners = {field: [] for field in self.FIELDS}
+        self.screen = "SearchScreen"
+        self.search_criteria = {}
+        self.search_results = []
+        self.selected_bus = None
+        self.selected_seats = SeatSelection()
+        self.total_fare = 0
+        self.passenger_details = {}   # Passenger info kept until payment
+        self.group_size = 1           # Passengers travelling together, for seat suggestions
+        self.seat_preference = "Any"
+
+    def subscribe(self, field, callback):
+        self._listeners[field].append(callback)
+
+    def _emit(self, field, *args):
+        for callback in self._listeners[field]:
+            callback(*args)
+
+    def set(self, field, value):
+        """Updates a plain field, notifying subscribers only if the value changed."""
+        if field == "selected_seats":
+            raise ValueError("use toggle_seat() or clear_seats() to change the selection")
+        if getattr(self, field) == value:
+            return
+        setattr(self, field, value)
+        self._emit(field, value)
+
+    def search(self, criteria, results):
+        self.set("search_criteria", criteria)
+        self.set("search_results", results)
+
+    def select_bus(self, bus):
+        self.set("selected_bus", bus)
+        self.clear_seats()
+
+    def toggle_seat(self, seat_num):
+        selected = self.selected_seats.toggle(seat_num)
+        self._emit("selected_seats", seat_num, selected)
+        self._update_fare()
+        return selected
+
+    def clear_seats(self):
+        if len(self.selected_seats):
+            self.selected_seats = SeatSelection()
+            self._emit("selected_seats", None, False)
+        self._update_fare()
+
+    def _update_fare(self):
+        price = self.selected_bus["price"] if self.selected_bus else 0
+        self.set("total_fare", len(self.selected_seats) * price)
+
+    def snapshot(self):
+        """Plain, JSON-friendly copy of the whole flow."""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["selected_seats"] = self.selected_seats.as_list()
+        return json.loads(json.dumps(data))
+
+    def restore(self, data):
+        """Loads a snapshot, notifying every subscriber once."""
+        for field in self.FIELDS:
+            if field == "selected_seats" or field not in data:
+                continue
+            setattr(self, field, data[field])
+            self._emit(field, data[field])
+        self.selected_seats = SeatSelection(data.get("selected_seats", ()))
+        self._emit("selected_seats", None, False)
+        for seat_num in self.selected_seats:
+            self._emit("selected_seats", seat_num, True)
+
+    def reset(self):
+        """Back to an empty flow, e.g. after a booking is confirmed."""
+        self.restore(BookingState().snapshot())
+
+    # Never written to disk: on a shared kiosk the next customer would see them
+    PRIVATE_FIELDS = ("passenger_details",)
+    BUS_KEYS = ("id", "name", "type", "from", "to", "dep_time", "arr_time", "duration",
+                "price", "seats_total", "seats_booked", "seats_available", "result_index")
+
+    def save(self, path):
+        data = self.snapshot()
+        for field in self.PRIVATE_FIELDS:
+            data.pop(field, None)
+        with open(path, mode='w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def _is_valid(cls, data):
+        """Checks a saved flow has the shape the screens expect."""
+        if not isinstance(data, dict):
+            return False
+        buses = data.get("search_results", [])
+        if not isinstance(buses, list):
+            return False
+        if data.get("selected_bus") is not None:
+            buses = buses + [data["selected_bus"]]
+        for bus in buses:
+            if not isinstance(bus, dict) or any(k not in bus for k in cls.BUS_KEYS):
+                return False
+            if not isinstance(bus["seats_booked"], list) or not isinstance(bus["price"], int):
+                return False
+        seats = data.get("selected_seats", [])
+        return (isinstance(seats, list) and all(s in ALL_SEATS for s in seats)
+                and isinstance(data.get("search_criteria", {}), dict)
+                and isinstance(data.get("screen", "SearchScreen"), str)
+                and isinstance(data.get("total_fare", 0), int)
+                and isinstance(data.get("group_size", 1), int))
+
+    def load(self, path):
+        """
+        Restores a saved flow. Returns False, leaving an empty flow, if there
+        is none or it is unreadable, outdated or malformed.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if not self._is_valid(data):
+                raise ValueError("unexpected layout")
+            self.restore(data)
+        except Exception as e:
+            # Whatever is wrong with the file, start on an empty flow rather than not at all
+            print(f"Could not resume the saved booking flow: {e}")
+            self.reset()
+            return False
+        return True
+
+
+# --- Helper Class: Session Recorder ---
+class SessionRecorder:
+    """
+    Captures the booking flow as a compact event log.
+    Each finished session is written as one JSON line:
+    [[ms_since_previous_event, kind, payload], ...]
+    """
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.events = []
+        self._last = None
+        self._lock = threading.Lock()
+
+    def record(self, kind, payload=None):
+        now = time.monotonic()
+        gap_ms = 0 if self._last is None else int((now - self._last) * 1000)
+        self._last = now
+        self.events.append([gap_ms, kind, payload])
+
+    def end_session(self):
+        """Flushes the current session (completed or abandoned) to the log."""
+        if not self.events:
+            return
+        line = json.dumps(self.events, separators=(",", ":"))
+        with self._lock:
+            with open(self.log_file, mode='a') as f:
+                f.write(line + "\n")
+        self.events = []
+        self._last = None
+
+    @staticmethod
+    def load(log_file):
+        """Reads all recorded sessions back from a log file."""
+        sessions = []
+        with open(log_file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    sessions.append(json.loads(line))
+        return sessions
+
+
+# --- Helper Class: Load Harness ---
+class LoadHarness:
+    """
+    Replays recorded sessions headlessly against the booking logic with
+    N concurrent virtual users. No display or network is needed.
+    """
+    STEPS = ["search", "bus", "seat", "details", "pay"]
+
+    def __init__(self, sessions, users=10, think_time=0.0, iterations=1,
+                 data_dir="loadtest_bookings", bus_service=None, notifications=None):
+        self.sessions = sessions
+        self.users = users
+        self.think_time = think_time   # Seconds; None replays the recorded gaps
+        self.iterations = iterations   # Passes over the session list per user
+        self.data_dir = data_dir
+        # In-memory schedule so load runs never touch the kiosk's snapshot
+        self.bus_service = bus_service or BusService(snapshot_file=None)
+        # Confirmations are queued exactly as the app does, but never sent
+        if notifications is None:
+            os.makedirs(data_dir, exist_ok=True)
+            notifications = NotificationQueue(os.path.join(data_dir, NOTIFY_DB))
+        self.notifications = notifications
+        self.latencies = {step: [] for step in self.STEPS}
+        self.skipped = {step: 0 for step in self.STEPS}   # Steps that had nothing to act on
+        self.bookings = 0
+        self.errors = 0       # Sessions that raised part-way through
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Runs all virtual users to completion and returns the report dict."""
+        threads = [threading.Thread(target=self._user_loop, args=(u,), daemon=True)
+                   for u in range(self.users)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def _user_loop(self, user_idx):
+        # Stagger users over the session list so they don't all replay the same one
+        count = len(self.sessions)
+        for i in range(self.iterations * count):
+            self._replay(self.sessions[(user_idx + i) % count])
+
+    def _replay(self, events):
+        state = BookingState()
+        timings = []
+        try:
+            for gap_ms, kind, payload in events:
+                self._think(gap_ms)
+                handler = getattr(self, f"_step_{kind}", None)
+                if handler is None:
+                    continue
+                start = time.perf_counter()
+                did_work = handler(state, payload)
+                # A no-op step (no bus picked, seat taken...) would only drag the percentiles down
+                timings.append((kind, time.perf_counter() - start if did_work else None))
+                if did_work and kind == "pay":
+                    with self._lock:
+                        self.bookings += 1
+        except Exception as e:
+            # One bad session must not kill the virtual user or vanish from the report
+            with self._lock:
+                self.errors += 1
+                if self.errors == 1:
+                    print(f"Session failed: {e!r}")
+        with self._lock:
+            for kind, secs in timings:
+                if secs is None:
+                    self.skipped[kind] += 1
+                else:
+                    self.latencies[kind].append(secs)
+
+    def _think(self, gap_ms):
+        delay = gap_ms / 1000.0 if self.think_time is None else self.think_time
+        if delay > 0:
+            time.sleep(delay)
+
+    # Each step returns True if it did work and False if it was skipped
+
+    def _step_search(self, state, payload):
+        buses = self.bus_service.search_buses(payload["from"], payload["to"], payload["date"])
+        state.search(payload, buses)
+        state.select_bus(None)
+        return True
+
+    def _step_bus(self, state, payload):
+        # Results are regenerated per search, so pick by position in the list
+        if not state.search_results:
+            return False
+        state.select_bus(state.search_results[payload % len(state.search_results)])
+        return True
+
+    def _step_seat(self, state, payload):
+        bus = state.selected_bus
+        if bus is None or payload in bus["seats_booked"]:
+            return False
+        state.toggle_seat(payload)
+        return True
+
+    def _step_details(self, state, payload):
+        if validate_passenger(payload.get("name", ""), payload.get("age", ""), payload.get("gender", ""),
+                              payload.get("email", ""), payload.get("phone", "")) is not None:
+            return False
+        state.set("passenger_details", payload)
+        return True
+
+    def _step_pay(self, state, payload):
+        if state.selected_bus is None or not len(state.selected_seats) or not state.passenger_details:
+            return False
+        place_booking(state, self.bus_service, self.notifications, self.data_dir)
+        return True
+
+    def report(self, elapsed):
+        """
+        Builds p50/p95/p99 latency (ms) per step plus overall bookings/sec.
+        Percentiles cover only the steps that did work; the rest are counted
+        as skipped.
+        """
+        steps = {}
+        for step, samples in self.latencies.items():
+            skipped = self.skipped[step]
+            if not samples and not skipped:
+                continue
+            ordered = sorted(samples)
+            steps[step] = {
+                "count": len(ordered),
+                "skipped": skipped,
+                "p50": _percentile(ordered, 50) * 1000 if ordered else None,
+                "p95": _percentile(ordered, 95) * 1000 if ordered else None,
+                "p99": _percentile(ordered, 99) * 1000 if ordered else None,
+            }
+        return {
+            "users": self.users,
+            "elapsed_s": elapsed,
+            "bookings": self.bookings,
+            "errors": self.errors,
+            "bookings_per_s": self.bookings / elapsed if elapsed > 0 else 0.0,
+            "steps": steps,
+        }
+
+def _percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[int(rank) - 1]
+
+def print_load_report(report):
+    print(f"Virtual users: {report['users']}   Elapsed: {report['elapsed_s']:.2f}s")
+    print(f"Bookings: {report['bookings']}   Throughput: {report['bookings_per_s']:.1f} bookings/s"
+          f"   Failed sessions: {report['errors']}")
+    print(f"{'Step':<10}{'Count':>8}{'Skipped':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step in LoadHarness.STEPS:
+        stats = report["steps"].get(step)
+        if not stats:
+            continue
+        if stats["count"]:
+            pcts = f"{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}"
+        else:
+            pcts = f"{'-':>10}{'-':>10}{'-':>10}"
+        print(f"{step:<10}{stats['count']:>8}{stats['skipped']:>9}{pcts}")
+
+
+# --- Helper Class: Notification Queue ---
+class NotificationQueue:
+    """
+    Durable local outbound queue for booking confirmations, backed by SQLite.
+    Messages survive restarts and stay pending until a transport accepts them.
+    """
+    def __init__(self, db_file=NOTIFY_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                subject TEXT,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL DEFAULT 0,
+                last_error TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt)")
+        self._conn.commit()
+        self.on_enqueue = None   # Set by the dispatcher so new work wakes it up
+
+    def enqueue(self, channel, recipient, subject, body):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (channel, recipient, subject, body, next_attempt) VALUES (?, ?, ?, ?, ?)",
+                (channel, recipient, subject, body, time.time()))
+            self._conn.commit()
+        if self.on_enqueue:
+            self.on_enqueue()
+
+    def due_batch(self, limit):
+        """Returns up to `limit` pending messages whose retry time has come."""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT id, channel, recipient, subject, body, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (time.time(), limit))
+            cols = ["id", "channel", "recipient", "subject", "body", "attempts"]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def next_due_in(self):
+        """Seconds until the next pending message is due, or None if the queue is empty."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def mark_sent(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET status = 'sent' WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def mark_failed(self, msg_id, attempts, error, retry_at=None):
+        """Schedules a retry at `retry_at`, or gives up on the message if it is None."""
+        with self._lock:
+            if retry_at is None:
+                self._conn.execute(
+                    "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, msg_id))
+            else:
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt = ? WHERE id = ?",
+                    (attempts, error, retry_at, msg_id))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Notification Transports ---
+class SmtpTransport:
+    """Sends email confirmations through an SMTP server, one connection per batch."""
+    def __init__(self, host="localhost", port=25, sender="noreply@voyago.example"):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send_batch(self, messages):
+        """Sends each message; returns {id: error} for the ones that failed."""
+        failures = {}
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            for m in messages:
+                try:
+                    smtp.send_message(_build_email(self.sender, m))
+                except smtplib.SMTPException as e:
+                    failures[m["id"]] = str(e)
+        return failures
+
+class LocalOutboxTransport:
+    """
+    Local SMTP stand-in for testing: writes each message as an .eml file
+    under OUTBOX_DIR/<channel>/ instead of talking to a server.
+    """
+    def __init__(self, outbox_dir=OUTBOX_DIR, sender="noreply@voyago.example"):
+        self.outbox_dir = outbox_dir
+        self.sender = sender
+
+    def send_batch(self, messages):
+        failures = {}
+        for m in messages:
+            try:
+                folder = os.path.join(self.outbox_dir, m["channel"])
+                os.makedirs(folder, exist_ok=True)
+                path = os.path.join(folder, f"{m['id']:08d}.eml")
+                with open(path, mode='wb') as f:
+                    f.write(bytes(_build_email(self.sender, m)))
+            except OSError as e:
+                failures[m["id"]] = str(e)
+        return failures
+
+def _build_email(sender, m):
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = m["recipient"]
+    msg["Subject"] = m["subject"] or ""
+    msg.set_content(m["body"])
+    return msg
+
+
+# --- Helper Class: Notification Dispatcher ---
+class NotificationDispatcher:
+    """
+    Background thread that drains the NotificationQueue in batches, with
+    exponential backoff on failure and a cap on messages sent per second.
+    `transports` maps a channel name ("email", "sms") to a transport.
+    """
+    def __init__(self, queue, transports, batch_size=20, rate_per_sec=10.0,
+                 base_delay=2.0, max_delay=300.0, max_attempts=6):
+        self.queue = queue
+        self.transports = transports
+        self.batch_size = batch_size
+        self.rate_per_sec = rate_per_sec
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        queue.on_enqueue = self._wake.set
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Asks the dispatcher to finish. Returns True once its thread has exited."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def _run(self):
+        db_failures = 0
+        while not self._stop.is_set():
+            try:
+                if self.dispatch_once():
+                    db_failures = 0
+                    continue
+                wait = self.queue.next_due_in()
+                db_failures = 0
+            except sqlite3.Error as e:
+                # Locked or unreadable outbox: back off and retry instead of letting the thread die
+                db_failures += 1
+                delay = min(self.max_delay, self.base_delay * (2 ** (db_failures - 1)))
+                print(f"Notification queue error, retrying in {delay:.0f}s: {e}")
+                self._stop.wait(delay)
+                continue
+            # Nothing due: sleep until the next retry or until new work arrives
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def dispatch_once(self):
+        """Sends one batch. Returns the number of messages attempted."""
+        batch = self.queue.due_batch(self.batch_size)
+        if not batch:
+            return 0
+        started = time.monotonic()
+
+        by_channel = {}
+        for m in batch:
+            by_channel.setdefault(m["channel"], []).append(m)
+
+        sent_ids = []
+        for channel, messages in by_channel.items():
+            transport = self.transports.get(channel)
+            if transport is None:
+                failures = {m["id"]: f"no transport for channel '{channel}'" for m in messages}
+            else:
+                try:
+                    failures = transport.send_batch(messages)
+                except Exception as e:
+                    # Connection-level failure: the whole batch retries
+                    failures = {m["id"]: str(e) for m in messages}
+            for m in messages:
+                if m["id"] in failures:
+                    self._retry_later(m, failures[m["id"]])
+                else:
+                    sent_ids.append(m["id"])
+        self.queue.mark_sent(sent_ids)
+
+        # Rate limit: a batch of n messages takes at least n / rate seconds
+        min_duration = len(batch) / self.rate_per_sec
+        remaining = min_duration - (time.monotonic() - started)
+        if remaining > 0:
+            self._stop.wait(remaining)
+        return len(batch)
+
+    def _retry_later(self, m, error):
+        attempts = m["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self.queue.mark_failed(m["id"], attempts, error)
+            return
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        delay *= random.uniform(0.8, 1.2)   # Jitter so retries don't arrive in lockstep
+        self.queue.mark_failed(m["id"], attempts, error, retry_at=time.time() + delay)
+
+def queue_booking_confirmation(queue, booking_id, bus, date, seats, details, total_fare):
+    """Queues the email and SMS confirmation for a saved booking."""
+    summary = (f"Booking {booking_id}: {bus['from']} to {bus['to']} on {date}, "
+               f"{bus['name']} ({bus['dep_time']}), seats {seats}, INR {total_fare}")
+    if details.get("email"):
+        body = (f"Dear {details.get('name')},\n\nYour booking is confirmed.\n\n{summary}\n\n"
+                "Thank you for choosing Voyago!")
+        queue.enqueue("email", details["email"], f"Voyago booking {booking_id} confirmed", body)
+    if details.get("phone"):
+        queue.enqueue("sms", details["phone"], None, f"Voyago: {summary}")
+
+
 # --- Main Application Class ---
 class VoyagoApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, record_file=None, smtp_server=None):
         super().__init__()
         self.title(WINDOW_TITLE)
         self.geometry("900x600") 
@@ -165,16 +1542,29 @@ class VoyagoApp(tk.Tk):
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
         
-        # Shared State
-        self.search_criteria = {}
-        self.selected_bus = None
-        self.selected_seats = []
-        self.total_fare = 0
-        self.passenger_details = {} # Store passenger info before payment
+        # Shared State (screens subscribe to the fields they display)
+        self.state = BookingState()
         
         # Service
         self.bus_service = BusService()
         
+        # Optional session recording for load testing
+        self.recorder = SessionRecorder(record_file) if record_file else None
+        
+        # Confirmations go through a durable queue so booking never waits on email/SMS
+        self.notifications = NotificationQueue()
+        if smtp_server:
+            host, _, port = smtp_server.partition(":")
+            email_transport = SmtpTransport(host, int(port or 25))
+        else:
+            email_transport = LocalOutboxTransport()
+        self.dispatcher = NotificationDispatcher(self.notifications, {
+            "email": email_transport,
+            "sms": LocalOutboxTransport(),   # No SMS gateway yet; keep messages locally
+        })
+        self.dispatcher.start()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Container for frames
         self.container = tk.Frame(self, bg=COLOR_BG)
         self.container.grid(row=0, column=0, sticky="nsew")
@@ -193,12 +1583,21 @@ class VoyagoApp(tk.Tk):
             # Put all frames in the same cell, they will stack
             frame.grid(row=0, column=0, sticky="nsew")
         
-        self.show_frame("SearchScreen")
+        # Resume where the last session left off, without searching again
+        if self.state.load(FLOW_STATE_FILE) and self.state.screen in self.frames and \
+                (self.state.selected_bus or self.state.screen in ("SearchScreen", "ResultsScreen")):
+            # Passenger details are not saved, so a flow left at payment resumes at the form
+            screen = "BookingScreen" if self.state.screen == "PaymentScreen" else self.state.screen
+            self.show_frame(screen)
+        else:
+            self.state.reset()
+            self.show_frame("SearchScreen")
 
     def show_frame(self, page_name):
         """Raises a frame to the top."""
         frame = self.frames[page_name]
         frame.tkraise()
+        self.state.set("screen", page_name)
         # Optional: Call a refresh method if the frame has one
         if hasattr(frame, "on_show"):
             frame.on_show()
@@ -206,48 +1605,50 @@ class VoyagoApp(tk.Tk):
     def get_page(self, page_name):
         return self.frames[page_name]
 
+    def on_close(self):
+        # Keep the flow that was in progress when the window closed
+        if self.recorder:
+            try:
+                self.recorder.end_session()
+            except OSError as e:
+                print(f"Could not write session log: {e}")
+        self.bus_service.close()
+        try:
+            self.state.save(FLOW_STATE_FILE)
+        except OSError as e:
+            print(f"Could not save booking flow: {e}")
+        # Only close the queue once the dispatcher can no longer touch it
+        if self.dispatcher.stop():
+            self.notifications.close()
+        self.destroy()
+
+    def record(self, kind, payload=None):
+        """Adds an event to the session log when recording is enabled."""
+        if self.recorder:
+            self.recorder.record(kind, payload)
+
     def save_booking(self):
-        details = self.passenger_details
-        bus = self.selected_bus
-        seats = ",".join(self.selected_seats)
-        booking_id = f"BKG{random.randint(10000, 99999)}"
-        
-        row = [
-            booking_id,
-            bus["from"],
-            bus["to"],
-            self.search_criteria["date"],
-            bus["name"],
-            seats,
-            details.get("name"),
-            details.get("age"),
-            details.get("gender"),
-            details.get("phone"),
-            details.get("email"),
-            self.total_fare
-        ]
-        
-        # Write to CSV
-        file_exists = os.path.isfile(DATA_FILE)
+        state = self.state
+        bus = state.selected_bus
         try:
-            with open(DATA_FILE, mode='a', newline='') as f:
-                writer = csv.writer(f)
-                if not file_exists:
-                    writer.writerow(["Booking ID", "From", "To", "Date of Journey", "Bus Name", 
-                                     "Seat Numbers", "Passenger Name", "Age", "Gender", "Contact", "Email", "Total Fare"])
-                writer.writerow(row)
-            
-            # Success Message
-            msg = (f"Booking Confirmed!\n\nID: {booking_id}\nBus: {bus['name']}\n"
-                   f"Seats: {seats}\nTotal Fare: INR {self.total_fare}\n\n"
-                   "Thank you for choosing Voyago!")
-            messagebox.showinfo("Success", msg)
-            
-            # Return to Home
-            self.show_frame("SearchScreen")
-            
+            booking_id, seats = place_booking(state, self.bus_service, self.notifications)
         except Exception as e:
             messagebox.showerror("Error", f"Could not save booking: {e}")
+            return
+        
+        self.record("pay")
+        if self.recorder:
+            self.recorder.end_session()
+        
+        # Success Message (shown after this handler returns)
+        msg = (f"Booking Confirmed!\n\nID: {booking_id}\nBus: {bus['name']}\n"
+               f"Seats: {seats}\nTotal Fare: INR {state.total_fare}\n\n"
+               "Thank you for choosing Voyago!")
+        self.after_idle(lambda: messagebox.showinfo("Success", msg))
+        
+        # Return to Home with a fresh flow
+        state.reset()
+        self.show_frame("SearchScreen")
 
 # --- Screen 1: Home/Search ---
 class SearchScreen(tk.Frame):
@@ -338,6 +1739,13 @@ class SearchScreen(tk.Frame):
                                padx=20, pady=8,
                                relief="flat", command=self.on_search)
         btn_search.grid(row=3, column=1, columnspan=2, pady=40, sticky="ew")
+        
+        controller.state.subscribe("search_criteria", self.on_criteria_change)
+
+    def on_criteria_change(self, criteria):
+        self.var_from.set(criteria.get("from", ""))
+        self.var_to.set(criteria.get("to", ""))
+        self.date_var.set(criteria.get("date", ""))
 
     def on_search(self):
         f = self.var_from.get()
@@ -359,8 +1767,16 @@ class SearchScreen(tk.Frame):
             messagebox.showerror("Date Error", "Invalid date format. Please use DD-MM-YYYY.")
             return
 
-        # Save criteria and move to next screen
-        self.controller.search_criteria = {"from": f, "to": t, "date": d}
+        # Search, save criteria and results, and move to next screen
+        criteria = {"from": f, "to": t, "date": d}
+        buses = self.controller.bus_service.search_buses(f, t, d)
+        for idx, bus in enumerate(buses):
+            bus["result_index"] = idx
+        # A new search starts a new session; flush any abandoned one first
+        if self.controller.recorder:
+            self.controller.recorder.end_session()
+        self.controller.record("search", criteria)
+        self.controller.state.search(criteria, buses)
         self.controller.show_frame("ResultsScreen")
 
 # --- Screen 2: Search Results ---
@@ -380,6 +1796,17 @@ class ResultsScreen(tk.Frame):
         self.lbl_route = tk.Label(top_bar, text="", font=("Arial", 14, "bold"), bg=COLOR_WHITE)
         self.lbl_route.pack(side="left", padx=20)
         
+        # Group ranking controls (right side)
+        tk.Button(top_bar, text="Best for Group", command=self.rank_for_group,
+                  bg=COLOR_WHITE, relief="flat", font=("Arial", 10, "bold")).pack(side="right", padx=10)
+        self.var_pref = tk.StringVar(value="Any")
+        ttk.Combobox(top_bar, textvariable=self.var_pref, values=SEAT_PREFERENCES,
+                     state="readonly", width=8).pack(side="right", padx=5)
+        self.var_group = tk.IntVar(value=1)
+        tk.Spinbox(top_bar, from_=1, to=8, textvariable=self.var_group, width=3,
+                   state="readonly").pack(side="right", padx=5)
+        tk.Label(top_bar, text="Passengers:", font=("Arial", 10), bg=COLOR_WHITE).pack(side="right")
+        
         # Results Area (Scrollable)
         self.canvas = tk.Canvas(self, bg=COLOR_BG)
         self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
@@ -400,19 +1827,27 @@ class ResultsScreen(tk.Frame):
         self.canvas.pack(side="left", fill="both", expand=True, padx=20, pady=20)
         self.scrollbar.pack(side="right", fill="y")
         
+        # Cards are only rebuilt when a new search comes in, not on every visit
+        state = controller.state
+        state.subscribe("search_criteria", self.on_criteria_change)
+        state.subscribe("search_results", self.render_results)
+        state.subscribe("group_size", self.var_group.set)
+        state.subscribe("seat_preference", self.var_pref.set)
+        
     def on_canvas_configure(self, event):
         # Resize the inner frame to match the canvas width
         self.canvas.itemconfig(self.canvas_window, width=event.width)
 
-    def on_show(self):
+    def on_criteria_change(self, criteria):
+        if criteria:
+            self.lbl_route.config(text=f"{criteria['from']}  →  {criteria['to']}  |  {criteria['date']}")
+        else:
+            self.lbl_route.config(text="")
+
+    def render_results(self, buses):
         # Clear previous results
         for widget in self.scrollable_frame.winfo_children():
             widget.destroy()
-            
-        criteria = self.controller.search_criteria
-        self.lbl_route.config(text=f"{criteria['from']}  →  {criteria['to']}  |  {criteria['date']}")
-        
-        buses = self.controller.bus_service.search_buses(criteria['from'], criteria['to'], criteria['date'])
         
         if not buses:
             lbl_no_bus = tk.Label(self.scrollable_frame, text="No buses found for this route.", 
@@ -423,7 +1858,26 @@ class ResultsScreen(tk.Frame):
         for bus in buses:
             self.create_bus_card(bus)
 
-    def create_bus_card(self, bus):
+    def rank_for_group(self):
+        """Reorders the results so buses that seat the whole group together come first."""
+        state = self.controller.state
+        if not state.search_results:
+            return
+        state.set("group_size", self.var_group.get())
+        state.set("seat_preference", self.var_pref.get())
+        ranked = rank_buses_for_group(state.search_results, state.group_size, state.seat_preference)
+        
+        for widget in self.scrollable_frame.winfo_children():
+            widget.destroy()
+        fitting = set()
+        for bus, seats, _ in ranked:
+            fitting.add(bus["result_index"])
+            self.create_bus_card(bus, group_seats=seats)
+        for bus in state.search_results:
+            if bus["result_index"] not in fitting:
+                self.create_bus_card(bus)
+
+    def create_bus_card(self, bus, group_seats=None):
         card = tk.Frame(self.scrollable_frame, bg=COLOR_WHITE, bd=1, relief="solid")
         card.pack(fill="x", pady=10, ipady=10)
         
@@ -446,6 +1900,9 @@ class ResultsScreen(tk.Frame):
         # Price & Seats
         tk.Label(card, text=f"INR {bus['price']}", font=("Arial", 14, "bold"), fg=COLOR_PRIMARY, bg=COLOR_WHITE).grid(row=0, column=4)
         tk.Label(card, text=f"{bus['seats_available']} Seats Left", font=("Arial", 10), fg="gray", bg=COLOR_WHITE).grid(row=1, column=4)
+        if group_seats:
+            tk.Label(card, text=f"Group fits: {', '.join(group_seats)}", font=("Arial", 9), 
+                     fg=COLOR_SEAT_BORDER_AVAILABLE, bg=COLOR_WHITE).grid(row=2, column=4)
         
         # View Seats Button
         btn_view = tk.Button(card, text="VIEW SEATS", bg=COLOR_PRIMARY, fg="black", 
@@ -454,7 +1911,8 @@ class ResultsScreen(tk.Frame):
         btn_view.grid(row=0, column=5, rowspan=2, padx=20)
 
     def select_bus(self, bus):
-        self.controller.selected_bus = bus
+        self.controller.state.select_bus(bus)
+        self.controller.record("bus", bus.get("result_index", 0))
         self.controller.show_frame("SeatSelectionScreen")
 
 # --- Screen 3: Seat Selection ---
@@ -506,10 +1964,32 @@ class SeatSelectionScreen(tk.Frame):
         self.lbl_total_fare = tk.Label(self.summary_frame, text="Total: INR 0", font=("Arial", 14, "bold"), fg=COLOR_PRIMARY, bg=COLOR_WHITE)
         self.lbl_total_fare.pack(pady=10)
         
+        # Group seat suggestion
+        group_frame = tk.Frame(self.summary_frame, bg=COLOR_WHITE)
+        group_frame.pack(pady=10)
+        tk.Label(group_frame, text="Passengers:", font=("Arial", 10), bg=COLOR_WHITE).grid(row=0, column=0, sticky="e", padx=5, pady=5)
+        self.var_group = tk.IntVar(value=1)
+        tk.Spinbox(group_frame, from_=1, to=8, textvariable=self.var_group, width=4,
+                   state="readonly").grid(row=0, column=1, sticky="w", padx=5, pady=5)
+        tk.Label(group_frame, text="Prefer:", font=("Arial", 10), bg=COLOR_WHITE).grid(row=1, column=0, sticky="e", padx=5, pady=5)
+        self.var_pref = tk.StringVar(value="Any")
+        ttk.Combobox(group_frame, textvariable=self.var_pref, values=SEAT_PREFERENCES,
+                     state="readonly", width=8).grid(row=1, column=1, sticky="w", padx=5, pady=5)
+        tk.Button(group_frame, text="Suggest Seats", font=("Arial", 10, "bold"), relief="flat",
+                  command=self.suggest_seats).grid(row=2, column=0, columnspan=2, pady=5)
+        
         self.btn_proceed = tk.Button(self.summary_frame, text="PROCEED", bg=COLOR_PRIMARY, fg="black",
                                      font=("Arial", 12, "bold"), relief="flat", state="disabled",
                                      command=self.proceed_to_booking)
         self.btn_proceed.pack(side="bottom", fill="x", padx=20, pady=20)
+        
+        # Only the widgets behind a changed field are touched
+        state = controller.state
+        state.subscribe("selected_bus", self.draw_seats)
+        state.subscribe("selected_seats", self.on_seat_change)
+        state.subscribe("total_fare", self.on_fare_change)
+        state.subscribe("group_size", self.var_group.set)
+        state.subscribe("seat_preference", self.var_pref.set)
 
     def _create_legend_item(self, parent, text, color, col, border_color=None):
         f = tk.Frame(parent, bg=COLOR_WHITE)
@@ -526,23 +2006,20 @@ class SeatSelectionScreen(tk.Frame):
             
         tk.Label(f, text=text, bg=COLOR_WHITE, font=("Arial", 9)).pack(side="left", padx=5)
 
-    def on_show(self):
-        # Reset state
-        self.controller.selected_seats = []
-        self.update_summary()
-        
+    def draw_seats(self, bus):
         # Clear grid
         for widget in self.grid_frame.winfo_children():
             widget.destroy()
         self.seat_buttons = {}
+        if bus is None:
+            self.lbl_bus_info.config(text="")
+            return
         
-        bus = self.controller.selected_bus
         self.lbl_bus_info.config(text=f"{bus['name']} ({bus['type']})")
         
         # Draw Seats (4 cols x 8 rows)
-        rows = 8
-        cols = 4
-        col_labels = ['A', 'B', 'C', 'D']
+        rows = SEAT_ROWS
+        col_labels = SEAT_COL_LABELS
         
         for r in range(1, rows + 1):
             for c_idx, c_label in enumerate(col_labels):
@@ -572,34 +2049,55 @@ class SeatSelectionScreen(tk.Frame):
                 self.seat_buttons[seat_num] = btn
 
     def toggle_seat(self, seat_num):
-        if seat_num in self.controller.selected_seats:
-            self.controller.selected_seats.remove(seat_num)
-            self.seat_buttons[seat_num].config(bg=COLOR_SEAT_AVAILABLE, fg=COLOR_TEXT, highlightbackground=COLOR_SEAT_BORDER_AVAILABLE)
-        else:
-            self.controller.selected_seats.append(seat_num)
+        self.controller.record("seat", seat_num)
+        self.controller.state.toggle_seat(seat_num)
+
+    def _paint_seat(self, seat_num, selected):
+        btn = self.seat_buttons.get(seat_num)
+        if btn is None:
+            return
+        if selected:
             # Remove border/change border to selected color if desired, or keep it. 
             # Usually selected has its own solid fill.
-            self.seat_buttons[seat_num].config(bg=COLOR_SEAT_SELECTED, fg=COLOR_WHITE, highlightbackground=COLOR_SEAT_SELECTED)
+            btn.config(bg=COLOR_SEAT_SELECTED, fg=COLOR_WHITE, highlightbackground=COLOR_SEAT_SELECTED)
+        elif btn.cget("state") != "disabled":
+            btn.config(bg=COLOR_SEAT_AVAILABLE, fg=COLOR_TEXT, highlightbackground=COLOR_SEAT_BORDER_AVAILABLE)
+
+    def on_seat_change(self, seat_num, selected):
+        if seat_num is None:
+            # Whole selection cleared
+            for s in self.seat_buttons:
+                self._paint_seat(s, False)
+        else:
+            self._paint_seat(seat_num, selected)
         
-        self.update_summary()
+        seats = self.controller.state.selected_seats
+        self.lbl_selected_seats.config(text=f"Seats: {seats.label()}" if len(seats) else "Seats: None")
 
-    def update_summary(self):
-        count = len(self.controller.selected_seats)
-        if count > 0:
-            seats_str = ", ".join(self.controller.selected_seats)
-            price = self.controller.selected_bus['price']
-            total = count * price
-            
-            self.lbl_selected_seats.config(text=f"Seats: {seats_str}")
-            self.lbl_total_fare.config(text=f"Total: INR {total}")
+    def on_fare_change(self, total):
+        self.lbl_total_fare.config(text=f"Total: INR {total}")
+        if total > 0:
             self.btn_proceed.config(state="normal", bg=COLOR_PRIMARY)
-            
-            self.controller.total_fare = total
         else:
-            self.lbl_selected_seats.config(text="Seats: None")
-            self.lbl_total_fare.config(text="Total: INR 0")
             self.btn_proceed.config(state="disabled", bg="gray")
 
+    def suggest_seats(self):
+        """Replaces the current selection with the best seats for the group."""
+        state = self.controller.state
+        state.set("group_size", self.var_group.get())
+        state.set("seat_preference", self.var_pref.get())
+        best = recommend_seats(seats_to_mask(state.selected_bus["seats_booked"]), state.group_size,
+                               state.seat_preference)
+        if best is None:
+            messagebox.showinfo("No Group Seats", 
+                                f"No {state.group_size} seats together are left on this bus.")
+            return
+        
+        for seat_num in state.selected_seats.as_list():
+            self.toggle_seat(seat_num)
+        for seat_num in best[0]:
+            self.toggle_seat(seat_num)
+
     def proceed_to_booking(self):
         self.controller.show_frame("BookingScreen")
 
@@ -671,23 +2169,22 @@ class BookingScreen(tk.Frame):
                                  font=("Arial", 12, "bold"), relief="flat", padx=20, pady=10,
                                  command=self.confirm_booking)
         self.btn_pay.pack(side="right", padx=20, pady=15)
+        
+        state = controller.state
+        state.subscribe("passenger_details", self.fill_form)
+        state.subscribe("total_fare", lambda total: self.lbl_footer_price.config(text=f"INR {total}"))
 
-    def on_show(self):
-        # Clear fields
-        self.ent_name.delete(0, tk.END)
-        self.ent_age.delete(0, tk.END)
-        self.var_gender.set("")
-        self.ent_email.delete(0, tk.END)
-    def on_show(self):
-        # Clear fields
+    def fill_form(self, details):
+        """Shows saved passenger details, or clears the form when there are none."""
         self.ent_name.delete(0, tk.END)
+        self.ent_name.insert(0, details.get("name", ""))
         self.ent_age.delete(0, tk.END)
-        self.var_gender.set("")
+        self.ent_age.insert(0, details.get("age", ""))
+        self.var_gender.set(details.get("gender", ""))
         self.ent_email.delete(0, tk.END)
+        self.ent_email.insert(0, details.get("email", ""))
         self.ent_phone.delete(0, tk.END)
-        
-        # Update Price in Footer
-        self.lbl_footer_price.config(text=f"INR {self.controller.total_fare}")
+        self.ent_phone.insert(0, details.get("phone", ""))
 
     def confirm_booking(self):
         name = self.ent_name.get().strip()
@@ -697,30 +2194,25 @@ class BookingScreen(tk.Frame):
         phone = self.ent_phone.get().strip()
         
         # Validation
-        if not name or not age or not gender or not email or not phone:
-            messagebox.showwarning("Missing Info", "Please fill all fields.")
-            return
-        
-        if not age.isdigit() or int(age) <= 0:
-            messagebox.showerror("Invalid Input", "Age must be a positive number.")
-            return
-            
-        if "@" not in email:
-            messagebox.showerror("Invalid Input", "Please enter a valid email.")
-            return
-            
-        if not phone.isdigit() or len(phone) != 10:
-            messagebox.showerror("Invalid Input", "Phone number must be 10 digits.")
+        error = validate_passenger(name, age, gender, email, phone)
+        if error:
+            title, message = error
+            if title == "Missing Info":
+                messagebox.showwarning(title, message)
+            else:
+                messagebox.showerror(title, message)
             return
             
         # Move to Payment Screen
-        self.controller.passenger_details = {
+        details = {
             "name": name,
             "age": age,
             "gender": gender,
             "email": email,
             "phone": phone
         }
+        self.controller.state.set("passenger_details", details)
+        self.controller.record("details", details)
         self.controller.show_frame("PaymentScreen")
 
 # --- Screen 5: Payment Screen ---
@@ -754,8 +2246,7 @@ class PaymentScreen(tk.Frame):
                                 command=self.show_qr_popup)
         self.btn_qr.pack()
         
-    def on_show(self):
-        self.lbl_amount.config(text=f"INR {self.controller.total_fare}")
+        controller.state.subscribe("total_fare", lambda total: self.lbl_amount.config(text=f"INR {total}"))
         
     def show_qr_popup(self):
         popup = tk.Toplevel(self)
@@ -781,7 +2272,7 @@ class PaymentScreen(tk.Frame):
         except Exception as e:
             tk.Label(popup, text=f"QR Code not found.\n{e}", bg=COLOR_WHITE, fg="red").pack(pady=20)
             
-        tk.Label(popup, text=f"Amount: INR {self.controller.total_fare}", font=("Arial", 12), bg=COLOR_WHITE).pack(pady=10)
+        tk.Label(popup, text=f"Amount: INR {self.controller.state.total_fare}", font=("Arial", 12), bg=COLOR_WHITE).pack(pady=10)
         
         # Done Button (Simulates successful payment)
         btn_done = tk.Button(popup, text="Payment Done", bg="#28a745", fg="black",
@@ -790,5 +2281,33 @@ class PaymentScreen(tk.Frame):
         btn_done.pack(side="bottom", pady=30)
 
 if __name__ == "__main__":
-    app = VoyagoApp()
-    app.mainloop()
+    parser = argparse.ArgumentParser(description=WINDOW_TITLE)
+    parser.add_argument("--record", metavar="LOG", help="record booking sessions to LOG")
+    parser.add_argument("--replay", metavar="LOG", help="replay sessions from LOG headlessly and report latency")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users for --replay")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="think time between steps in seconds; negative replays recorded gaps")
+    parser.add_argument("--iterations", type=int, default=1, help="passes over the session log per user")
+    parser.add_argument("--out", default="loadtest_bookings", help="bookings directory used by --replay")
+    parser.add_argument("--shard", type=int, default=os.environ.get("VOYAGO_SHARD", "0"),
+                        help="ID shard for this process (0-127); every kiosk/worker needs its own")
+    parser.add_argument("--smtp", metavar="HOST[:PORT]",
+                        help="send email confirmations via this SMTP server instead of the local outbox")
+    args = parser.parse_args()
+    if not 0 <= args.shard < 1 << _ID_SHARD_BITS:
+        parser.error(f"--shard must be between 0 and {(1 << _ID_SHARD_BITS) - 1}")
+    BOOKING_IDS.shard = BUS_IDS.shard = args.shard
+    id_tick_file = ID_TICK_FILE.format(shard=args.shard)
+    restore_id_ticks(id_tick_file, (BOOKING_IDS, BUS_IDS))
+
+    try:
+        if args.replay:
+            harness = LoadHarness(SessionRecorder.load(args.replay), users=args.users,
+                                  think_time=None if args.think < 0 else args.think,
+                                  iterations=args.iterations, data_dir=args.out)
+            print_load_report(harness.run())
+        else:
+            app = VoyagoApp(record_file=args.record, smtp_server=args.smtp)
+            app.mainloop()
+    finally:
+        save_id_ticks(id_tick_file, (BOOKING_IDS, BUS_IDS))